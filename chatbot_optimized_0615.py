@@ -1,30 +1,62 @@
 import streamlit as st
 from openai import OpenAI
-import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 import numpy as np
 import re
 import os
 import json
 from datetime import datetime, timedelta
 import hashlib
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Iterator
 import torch
+import torch.nn.functional as F
+import scipy.sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import nltk
-from nltk.tokenize import sent_tokenize
 import warnings
 import time
 import requests
 import glob
+import itertools
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pdf_extraction import extract_pdf_text
 warnings.filterwarnings("ignore")
 
+# Optional ONNX Runtime backend for CPU inference
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Optional approximate nearest-neighbour index
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Use every core for intra-op parallelism; inter-op threads can only be set once per process
+torch.set_num_threads(max(1, os.cpu_count() or 1))
+try:
+    torch.set_num_interop_threads(2)
+except RuntimeError:
+    pass
+
 # Download required NLTK data
 try:
     nltk.data.find('tokenizers/punkt')
 except LookupError:
     nltk.download('punkt')
+try:
+    nltk.data.find('tokenizers/punkt_tab')
+except LookupError:
+    nltk.download('punkt_tab')
 
 # --- CONFIGURATION ---
 st.set_page_config(
@@ -38,12 +70,34 @@ st.set_page_config(
 class Config:
     """Optimized configuration for institutional deployment."""
     CHUNK_SIZE = 800
-    CHUNK_OVERLAP = 150  # Your preferred setting
+    CHUNK_OVERLAP_SENTENCES = 2  # Trailing sentences repeated at the start of the next chunk
     SEARCH_RESULTS = 13  # Your preferred setting
     MODEL_NAME = 'all-MiniLM-L6-v2'
     CACHE_DURATION_DAYS = 90
     BATCH_SIZE = 32  # Larger batch size for efficiency
     MAX_RETRIES = 2  # Reduced retries for faster response
+    USE_ONNX_INT8 = True  # Use quantized ONNX Runtime model on CPU when optimum is installed
+    MAX_SEQ_LENGTH = 256  # default when the model does not report its own max_seq_length
+    
+    # FAISS HNSW index settings (used when faiss is installed)
+    USE_FAISS = True
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+    
+    # Answer cache: exact normalized-question match, then semantic match with identical content terms.
+    # Cosine alone can't separate paraphrases from near-misses on MiniLM: "in-state"/"out-of-state"
+    # tuition scores 0.966 (torch) / 0.951 (INT8) while "What are admission requirements" scores 0.905 / 0.895
+    ANSWER_CACHE_FILE = "answers.sqlite"
+    ANSWER_CACHE_SIMILARITY = 0.85
+    ANSWER_CACHE_CANDIDATES = 5
+    
+    # Skip the LLM when the best raw cosine AND the best TF-IDF score are both below these.
+    # Measured on the academic catalog (2033 chunks): relevant questions peak at cosine 0.31-0.79,
+    # off-topic ones at 0.11-0.43 with keyword scores up to 0.25
+    MIN_SEMANTIC_SCORE = 0.30
+    MIN_KEYWORD_SCORE = 0.25
+    NO_ANSWER_MESSAGE = "I couldn't find relevant information in the institutional documents to answer your question."
     
     # Institutional PDF directory
     INSTITUTIONAL_PDF_DIR = "institutional_pdfs"
@@ -51,73 +105,223 @@ class Config:
 
 # --- HELPER FUNCTIONS & CLASSES ---
 
+_SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_TERM_RE = re.compile(r"[a-z0-9]+(?:[-/'][a-z0-9]+)*")
+_QUESTION_STOPWORDS = frozenset("""
+a an the is are was were be do does did can could would should will i me my we our you your
+what what's whats how when where which who whom why tell about please for to of in on at from
+with and or another different there any
+""".split())
+
+def content_terms(question: str) -> frozenset:
+    """Lowercased question words minus filler, with plural 's' stripped; hyphenated terms stay whole."""
+    terms = set()
+    for term in _TERM_RE.findall(question.lower()):
+        if term in _QUESTION_STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+            term = term[:-1]
+        terms.add(term)
+    return frozenset(terms)
+
+def _combine_scores(sem: np.ndarray, kw: np.ndarray, w_s: float, w_k: float) -> np.ndarray:
+    """Fused (sem+1)/2 rescale and weighted sum using a single output array."""
+    out = np.add(sem, 1.0, dtype=np.float64)
+    out *= 0.5 * w_s
+    out += w_k * kw
+    return out
+
+def _write_atomically(path: str, write_fn) -> None:
+    """Write a file via write_fn(temp_path), then atomically replace path with it."""
+    root, ext = os.path.splitext(path)
+    # Keep the extension last so np.save/savez do not append another one
+    tmp_path = f"{root}.{os.getpid()}-{threading.get_ident()}.tmp{ext}"
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _dump_json(path: str, data) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+@st.cache_resource
+def load_sentence_splitter():
+    """Load the Punkt sentence tokenizer once per process, falling back to a regex split."""
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer  # NLTK >= 3.8.2
+        return PunktTokenizer('english').tokenize
+    except Exception:
+        pass
+    try:
+        return nltk.data.load('tokenizers/punkt/english.pickle').tokenize
+    except Exception:
+        return _SENT_SPLIT_RE.split
+
+class ONNXSentenceEncoder:
+    """Minimal SentenceTransformer-compatible encoder backed by an INT8 ONNX Runtime model."""
+    
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = torch.device('cpu')
+        self.max_seq_length = Config.MAX_SEQ_LENGTH
+    
+    def __call__(self, features: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """Mean-pooled embeddings for already tokenized inputs, mirroring SentenceTransformer."""
+        token_embeddings = self.model(**features).last_hidden_state
+        mask = features['attention_mask'].unsqueeze(-1).to(token_embeddings.dtype)
+        pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return {'sentence_embedding': pooled}
+    
+    def encode(self, sentences, batch_size: int = 32, convert_to_tensor: bool = False,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False):
+        """Tokenize, run the ONNX model, mean-pool and optionally L2-normalize."""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        
+        embeddings_list = []
+        for i in range(0, len(sentences), batch_size):
+            batch = sentences[i:i + batch_size]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=getattr(self, 'max_seq_length', Config.MAX_SEQ_LENGTH),
+                return_tensors='pt'
+            )
+            pooled = self(dict(inputs))['sentence_embedding']
+            if normalize_embeddings:
+                pooled = F.normalize(pooled, p=2, dim=1)
+            embeddings_list.append(pooled)
+        
+        embeddings = torch.cat(embeddings_list, dim=0)
+        if single:
+            embeddings = embeddings[0]
+        return embeddings if convert_to_tensor else embeddings.numpy()
+
+def _load_onnx_int8_model(model_name: str, cache_folder: str) -> ONNXSentenceEncoder:
+    """Export the embedding model to ONNX once, quantize it to INT8 and load it."""
+    model_id = f"sentence-transformers/{model_name}"
+    onnx_dir = os.path.join(cache_folder, "onnx", model_name)
+    quantized_dir = os.path.join(onnx_dir, "int8")
+    quantized_file = "model_quantized.onnx"
+    
+    if not os.path.exists(os.path.join(quantized_dir, quantized_file)):
+        model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True, cache_dir=cache_folder)
+        model.save_pretrained(onnx_dir)
+        
+        # Dynamic quantization uses VNNI instructions on modern Xeons
+        quantizer = ORTQuantizer.from_pretrained(model)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=quantized_dir, quantization_config=qconfig)
+        
+        AutoTokenizer.from_pretrained(model_id, cache_dir=cache_folder).save_pretrained(quantized_dir)
+    
+    model = ORTModelForFeatureExtraction.from_pretrained(quantized_dir, file_name=quantized_file)
+    tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+    encoder = ONNXSentenceEncoder(model, tokenizer)
+    encoder.backend_id = f"onnx-int8:{model_name}"
+    return encoder
+
+def select_device() -> str:
+    """Pick the best available torch device."""
+    if torch.cuda.is_available():
+        return 'cuda'
+    elif torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+@st.cache_resource
+def load_sbert(model_name: str, device: str):
+    """Load the embedding model once per (model name, device) with optimized retry logic."""
+    for attempt in range(Config.MAX_RETRIES):
+        try:
+            # Model cache directory
+            cache_folder = os.path.join(os.getcwd(), "model_cache")
+            os.makedirs(cache_folder, exist_ok=True)
+            
+            # Prefer the quantized ONNX Runtime model on CPU
+            if device == 'cpu' and Config.USE_ONNX_INT8 and ONNX_AVAILABLE:
+                try:
+                    return _load_onnx_int8_model(model_name, cache_folder)
+                except Exception:
+                    pass
+            
+            # Load model with optimized settings
+            model = SentenceTransformer(
+                model_name, 
+                device=device,
+                cache_folder=cache_folder
+            )
+            model.eval()
+            
+            # Make sure the Rust-backed tokenizer is used for batch tokenization
+            if not getattr(model.tokenizer, 'is_fast', False):
+                model.tokenizer = AutoTokenizer.from_pretrained(
+                    model.tokenizer.name_or_path,
+                    use_fast=True,
+                    cache_dir=cache_folder
+                )
+            
+            model.backend_id = f"torch:{model_name}"
+            return model
+            
+        except requests.exceptions.HTTPError as e:
+            if "429" in str(e):
+                wait_time = (2 ** attempt) * 3  # Reduced wait time
+                if attempt < Config.MAX_RETRIES - 1:
+                    time.sleep(wait_time)
+            else:
+                break
+        except Exception as e:
+            if attempt == Config.MAX_RETRIES - 1:
+                # Try fallback model
+                try:
+                    fallback_model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+                    fallback_model.backend_id = "torch:paraphrase-MiniLM-L6-v2"
+                    return fallback_model
+                except:
+                    return None
+            else:
+                time.sleep(2 ** attempt)
+    
+    return None
+
 class InstitutionalPDFChatbot:
     """Optimized PDF chatbot for institutional deployment with pre-loaded documents."""
     
     def __init__(self):
         self.pdf_contents: Dict[str, str] = {}
-        self.text_chunks: List[Dict] = []
+        # Chunk data is stored column-wise (one entry per chunk)
+        self.chunk_texts: List[str] = []
+        self.chunk_sources = np.empty(0, dtype=np.intp)  # indices into self.sources
+        self.chunk_ids = np.empty(0, dtype=np.intp)  # chunk position within its source
+        self.sources: List[str] = []
+        self.extra_sources: Dict[int, List[int]] = {}  # chunk index -> other sources with identical text
         self.chunk_embeddings = None
         self.tfidf_vectorizer = None
         self.tfidf_matrix = None
+        self.faiss_index = None
+        self.chunk_token_ids = None  # (flat token ids, offsets) for each chunk
         
         # Initialize directories
         os.makedirs(Config.INSTITUTIONAL_PDF_DIR, exist_ok=True)
         os.makedirs(Config.CACHE_DIR, exist_ok=True)
         
         # Load the sentence transformer model with optimized settings
-        self.embedding_model = self._load_embedding_model()
+        self.embedding_model = load_sbert(Config.MODEL_NAME, select_device())
         if self.embedding_model:
             self.model_device = self.embedding_model.device
+            # Backend and model name; cached vectors are only valid for the same one
+            self.embedding_backend = self.embedding_model.backend_id
         else:
             st.error("Could not load embedding model.")
             st.stop()
 
-    @st.cache_resource
-    def _load_embedding_model(_self):
-        """Load embedding model with optimized retry logic."""
-        for attempt in range(Config.MAX_RETRIES):
-            try:
-                # Determine best device
-                if torch.cuda.is_available():
-                    device = 'cuda'
-                elif torch.backends.mps.is_available():
-                    device = 'mps'
-                else:
-                    device = 'cpu'
-                
-                # Model cache directory
-                cache_folder = os.path.join(os.getcwd(), "model_cache")
-                os.makedirs(cache_folder, exist_ok=True)
-                
-                # Load model with optimized settings
-                model = SentenceTransformer(
-                    Config.MODEL_NAME, 
-                    device=device,
-                    cache_folder=cache_folder
-                )
-                
-                return model
-                
-            except requests.exceptions.HTTPError as e:
-                if "429" in str(e):
-                    wait_time = (2 ** attempt) * 3  # Reduced wait time
-                    if attempt < Config.MAX_RETRIES - 1:
-                        time.sleep(wait_time)
-                else:
-                    break
-            except Exception as e:
-                if attempt == Config.MAX_RETRIES - 1:
-                    # Try fallback model
-                    try:
-                        return SentenceTransformer('paraphrase-MiniLM-L6-v2')
-                    except:
-                        return None
-                else:
-                    time.sleep(2 ** attempt)
-        
-        return None
-
     def get_cache_path(self, identifier: str) -> str:
         """Generates cache path for institutional documents."""
         cache_hash = hashlib.md5(identifier.encode('utf-8')).hexdigest()
@@ -135,6 +339,8 @@ class InstitutionalPDFChatbot:
             cached_at_str = metadata.get('cached_at')
             if not cached_at_str: 
                 return False
+            if metadata.get('embedding_backend') != self.embedding_backend:
+                return False
             
             cached_date = datetime.fromisoformat(cached_at_str)
             return datetime.now() - cached_date < timedelta(days=Config.CACHE_DURATION_DAYS)
@@ -145,34 +351,65 @@ class InstitutionalPDFChatbot:
         """Save processed institutional data to cache."""
         cache_path = self.get_cache_path(identifier)
         
+        # Files are swapped in with os.replace so sessions still memory-mapping the
+        # previous files keep their old inodes; metadata goes last so a partial cache is never valid
         try:
+            # Chunk texts are stored as one UTF-8 buffer plus offsets
+            encoded_texts = [text.encode('utf-8') for text in self.chunk_texts]
+            text_offsets = np.concatenate(([0], np.cumsum([len(b) for b in encoded_texts]))).astype(np.int64)
+            _write_atomically(f"{cache_path}_chunks.npz", lambda path: np.savez_compressed(
+                path,
+                text_bytes=np.frombuffer(b''.join(encoded_texts), dtype=np.uint8),
+                text_offsets=text_offsets,
+                sources=np.array(self.sources, dtype=str),
+                chunk_sources=self.chunk_sources,
+                chunk_ids=self.chunk_ids,
+                duplicate_chunks=np.array(
+                    [chunk_idx for chunk_idx, extra in self.extra_sources.items() for _ in extra], dtype=np.intp
+                ),
+                duplicate_sources=np.array(
+                    [source_idx for extra in self.extra_sources.values() for source_idx in extra], dtype=np.intp
+                )
+            ))
+                
+            if self.chunk_embeddings is not None:
+                # Stored in the search dtype (FP16 on GPU/MPS, FP32 on CPU) so CPU loads can be zero-copy
+                embeddings = self.chunk_embeddings.cpu().numpy()
+                _write_atomically(f"{cache_path}_embeddings.npy", lambda path: np.save(path, embeddings))
+            
+            if self.chunk_token_ids is not None:
+                token_ids, offsets = self.chunk_token_ids
+                _write_atomically(f"{cache_path}_tokens.npz", lambda path: np.savez_compressed(
+                    path, token_ids=token_ids, offsets=offsets
+                ))
+            
+            # Save TF-IDF components
+            if self.tfidf_vectorizer is not None:
+                tfidf_state = {
+                    'vocabulary': {term: int(idx) for term, idx in self.tfidf_vectorizer.vocabulary_.items()},
+                    'idf': self.tfidf_vectorizer.idf_.tolist(),
+                    'ngram_range': list(self.tfidf_vectorizer.ngram_range),
+                    'stop_words': self.tfidf_vectorizer.stop_words
+                }
+                _write_atomically(f"{cache_path}_tfidf_vectorizer.json", lambda path: _dump_json(path, tfidf_state))
+                _write_atomically(f"{cache_path}_tfidf.npz", lambda path: scipy.sparse.save_npz(path, self.tfidf_matrix.tocsr()))
+            
+            if self.faiss_index is not None:
+                _write_atomically(f"{cache_path}_faiss.index", lambda path: faiss.write_index(self.faiss_index, path))
+            
             metadata = {
                 'identifier': identifier,
+                'embedding_backend': self.embedding_backend,
                 'cached_at': datetime.now().isoformat(),
                 'files_count': len(self.pdf_contents),
-                'chunks_count': len(self.text_chunks),
+                'chunks_count': len(self.chunk_texts),
                 'config': {
                     'chunk_size': Config.CHUNK_SIZE,
-                    'chunk_overlap': Config.CHUNK_OVERLAP,
+                    'chunk_overlap_sentences': Config.CHUNK_OVERLAP_SENTENCES,
                     'search_results': Config.SEARCH_RESULTS
                 }
             }
-            
-            with open(f"{cache_path}_meta.json", 'w', encoding='utf-8') as f:
-                json.dump(metadata, f)
-                
-            with open(f"{cache_path}_chunks.json", 'w', encoding='utf-8') as f:
-                json.dump(self.text_chunks, f)
-                
-            if self.chunk_embeddings is not None:
-                np.save(f"{cache_path}_embeddings.npy", self.chunk_embeddings.cpu().numpy())
-            
-            # Save TF-IDF components
-            if self.tfidf_vectorizer is not None:
-                import pickle
-                with open(f"{cache_path}_tfidf_vectorizer.pkl", 'wb') as f:
-                    pickle.dump(self.tfidf_vectorizer, f)
-                np.save(f"{cache_path}_tfidf_matrix.npy", self.tfidf_matrix.toarray())
+            _write_atomically(f"{cache_path}_meta.json", lambda path: _dump_json(path, metadata))
                 
         except Exception as e:
             st.error(f"Error saving to cache: {e}")
@@ -184,54 +421,61 @@ class InstitutionalPDFChatbot:
             return False
             
         try:
-            with open(f"{cache_path}_chunks.json", 'r', encoding='utf-8') as f:
-                self.text_chunks = json.load(f)
+            with np.load(f"{cache_path}_chunks.npz") as chunks:
+                text_bytes = chunks['text_bytes'].tobytes()
+                text_offsets = chunks['text_offsets']
+                self.chunk_texts = [
+                    text_bytes[start:end].decode('utf-8')
+                    for start, end in zip(text_offsets[:-1], text_offsets[1:])
+                ]
+                self.sources = chunks['sources'].tolist()
+                self.chunk_sources = chunks['chunk_sources'].astype(np.intp)
+                self.chunk_ids = chunks['chunk_ids'].astype(np.intp)
+                
+                self.extra_sources = {}
+                for chunk_idx, source_idx in zip(chunks['duplicate_chunks'].tolist(), chunks['duplicate_sources'].tolist()):
+                    self.extra_sources.setdefault(chunk_idx, []).append(source_idx)
             
-            loaded_embeddings = np.load(f"{cache_path}_embeddings.npy")
-            self.chunk_embeddings = torch.from_numpy(loaded_embeddings).to(self.model_device)
+            embeddings_file = f"{cache_path}_embeddings.npy"
+            if os.path.exists(embeddings_file):
+                # Memory-map the file; on CPU torch shares its storage, so pages are read on demand
+                loaded_embeddings = np.ascontiguousarray(np.load(embeddings_file, mmap_mode='r'))
+                if self.model_device.type == 'cpu' and loaded_embeddings.dtype == np.float32:
+                    self.chunk_embeddings = torch.from_numpy(loaded_embeddings)
+                else:
+                    self.chunk_embeddings = self._to_search_dtype(torch.from_numpy(loaded_embeddings))
+            else:
+                # Re-embed from cached token ids without re-tokenizing
+                with np.load(f"{cache_path}_tokens.npz") as tokens:
+                    self.chunk_token_ids = (tokens['token_ids'], tokens['offsets'])
+                self.chunk_embeddings = self._to_search_dtype(self._embed_token_ids(*self.chunk_token_ids))
 
             # Load TF-IDF components
-            import pickle
             try:
-                with open(f"{cache_path}_tfidf_vectorizer.pkl", 'rb') as f:
-                    self.tfidf_vectorizer = pickle.load(f)
-                self.tfidf_matrix = np.load(f"{cache_path}_tfidf_matrix.npy")
+                with open(f"{cache_path}_tfidf_vectorizer.json", 'r', encoding='utf-8') as f:
+                    tfidf_state = json.load(f)
+                self.tfidf_vectorizer = TfidfVectorizer(
+                    vocabulary=tfidf_state['vocabulary'],
+                    stop_words=tfidf_state['stop_words'],
+                    ngram_range=tuple(tfidf_state['ngram_range'])
+                )
+                self.tfidf_vectorizer.idf_ = np.asarray(tfidf_state['idf'], dtype=np.float64)
+                self.tfidf_matrix = scipy.sparse.load_npz(f"{cache_path}_tfidf.npz").tocsr()
             except FileNotFoundError:
                 self._create_tfidf_index()
+            
+            # Load the ANN index, rebuilding it if it was not cached
+            faiss_file = f"{cache_path}_faiss.index"
+            if Config.USE_FAISS and FAISS_AVAILABLE and os.path.exists(faiss_file):
+                self.faiss_index = faiss.read_index(faiss_file)
+                self.faiss_index.hnsw.efSearch = Config.HNSW_EF_SEARCH
+            else:
+                self._create_faiss_index()
 
             return True
         except Exception as e:
             return False
 
-    def extract_text_from_pdf(self, pdf_path: str, filename: str) -> None:
-        """Optimized PDF text extraction."""
-        try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                page_text = page.get_text()
-                
-                # Optimized text cleaning
-                page_text = re.sub(r'\s+', ' ', page_text)
-                page_text = re.sub(r'(\w+)-\s+(\w+)', r'\1\2', page_text)
-                page_text = re.sub(r'^\d+\s*$', '', page_text, flags=re.MULTILINE)
-                
-                text += page_text + "\n\n"
-            
-            doc.close()
-            
-            # Final cleaning
-            text = text.strip()
-            text = re.sub(r'\n{3,}', '\n\n', text)
-            
-            if len(text) > 100:
-                self.pdf_contents[filename] = text
-            
-        except Exception as e:
-            st.error(f"Error processing {filename}: {e}")
-
     def load_institutional_pdfs(self) -> bool:
         """Load all PDFs from the institutional directory."""
         self.pdf_contents = {}
@@ -242,80 +486,69 @@ class InstitutionalPDFChatbot:
         if not pdf_files:
             return False
         
+        # Extract in parallel; each worker opens and closes its own document
+        extracted = {}
+        max_workers = min(len(pdf_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(extract_pdf_text, pdf_path): os.path.basename(pdf_path)
+                for pdf_path in pdf_files
+            }
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    extracted[filename] = future.result()
+                except Exception as e:
+                    st.error(f"Error processing {filename}: {e}")
+        
+        # Keep directory order so chunk ids are stable across runs
         for pdf_path in pdf_files:
             filename = os.path.basename(pdf_path)
-            self.extract_text_from_pdf(pdf_path, filename)
+            if extracted.get(filename):
+                self.pdf_contents[filename] = extracted[filename]
         
         return len(self.pdf_contents) > 0
 
-    def smart_chunk_text(self, text: str, source: str) -> List[Dict]:
-        """Optimized text chunking."""
-        chunks = []
-        
+    def smart_chunk_text(self, text: str) -> List[str]:
+        """Optimized text chunking using prefix sums over sentence lengths."""
         try:
-            sentences = sent_tokenize(text)
+            sentences = load_sentence_splitter()(text)
         except:
-            sentences = re.split(r'(?<=[.!?])\s+', text)
+            sentences = _SENT_SPLIT_RE.split(text)
         
-        current_chunk = []
-        current_length = 0
+        sentences = [s for s in (sentence.strip() for sentence in sentences) if s]
+        if not sentences:
+            return []
         
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length > Config.CHUNK_SIZE and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                
-                # Add overlap
-                if chunks and Config.CHUNK_OVERLAP > 0:
-                    prev_chunk_words = chunks[-1]['text'].split()
-                    overlap_words = prev_chunk_words[-min(Config.CHUNK_OVERLAP//5, len(prev_chunk_words)):]
-                    chunk_text = ' '.join(overlap_words) + ' ' + chunk_text
-                
-                chunks.append({
-                    'text': chunk_text,
-                    'source': source,
-                    'chunk_id': len(chunks)
-                })
-                
-                # Start new chunk with overlap
-                if Config.CHUNK_OVERLAP > 0:
-                    overlap_sentences = current_chunk[-min(2, len(current_chunk)):]
-                    current_chunk = overlap_sentences + [sentence]
-                    current_length = sum(len(s) for s in current_chunk)
-                else:
-                    current_chunk = [sentence]
-                    current_length = sentence_length
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
+        # cum[i] is the total length of sentences[:i]
+        lens = np.fromiter((len(s) for s in sentences), dtype=np.int64, count=len(sentences))
+        cum = np.concatenate(([0], np.cumsum(lens)))
+        n = len(sentences)
         
-        # Add the last chunk
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            if chunks and Config.CHUNK_OVERLAP > 0:
-                prev_chunk_words = chunks[-1]['text'].split()
-                overlap_words = prev_chunk_words[-min(Config.CHUNK_OVERLAP//5, len(prev_chunk_words)):]
-                chunk_text = ' '.join(overlap_words) + ' ' + chunk_text
+        # Build chunks as (start, end) sentence windows; overlap is the last
+        # CHUNK_OVERLAP_SENTENCES sentences of the previous window
+        spans = []
+        start = 0
+        min_end = 1
+        while start < n:
+            # Largest end with sentences[start:end] fitting in CHUNK_SIZE,
+            # always taking at least one sentence not seen in the previous chunk
+            end = int(np.searchsorted(cum, cum[start] + Config.CHUNK_SIZE, side='right')) - 1
+            end = max(end, min_end)
+            spans.append((start, end))
             
-            chunks.append({
-                'text': chunk_text,
-                'source': source,
-                'chunk_id': len(chunks)
-            })
+            if end >= n:
+                break
+            
+            start = max(end - Config.CHUNK_OVERLAP_SENTENCES, start + 1) if Config.CHUNK_OVERLAP_SENTENCES > 0 else end
+            min_end = end + 1
         
-        return chunks
+        return [' '.join(sentences[start:end]) for start, end in spans]
 
     def _create_tfidf_index(self):
         """Create optimized TF-IDF index."""
-        if not self.text_chunks:
+        if not self.chunk_texts:
             return
-            
-        chunk_texts = [chunk['text'] for chunk in self.text_chunks]
         
         self.tfidf_vectorizer = TfidfVectorizer(
             max_features=5000,
@@ -325,53 +558,135 @@ class InstitutionalPDFChatbot:
             max_df=0.8
         )
         
-        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(chunk_texts)
+        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(self.chunk_texts)
+
+    def _create_faiss_index(self):
+        """Build an HNSW index over the (L2-normalized) chunk embeddings."""
+        self.faiss_index = None
+        if not (Config.USE_FAISS and FAISS_AVAILABLE) or self.chunk_embeddings is None:
+            return
+        
+        vectors = np.ascontiguousarray(self.chunk_embeddings.float().cpu().numpy(), dtype=np.float32)
+        
+        # Embeddings are normalized, so inner product == cosine similarity
+        index = faiss.IndexHNSWFlat(vectors.shape[1], Config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = Config.HNSW_EF_CONSTRUCTION
+        index.add(vectors)
+        index.hnsw.efSearch = Config.HNSW_EF_SEARCH
+        self.faiss_index = index
+
+    def _to_search_dtype(self, embeddings: torch.Tensor) -> torch.Tensor:
+        """Move embeddings to the model device: FP16 on GPU/MPS, FP32 on CPU."""
+        if self.model_device.type != 'cpu':
+            return embeddings.to(self.model_device, dtype=torch.float16)
+        return embeddings.to(self.model_device, dtype=torch.float32)
+
+    def _tokenize_chunks(self, chunk_texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Tokenize all chunks in one fast-tokenizer call; returns flat token ids and offsets."""
+        encoded = self.embedding_model.tokenizer(
+            chunk_texts,
+            padding=False,
+            truncation=True,
+            max_length=getattr(self.embedding_model, 'max_seq_length', Config.MAX_SEQ_LENGTH),
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )['input_ids']
+        
+        lengths = np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        token_ids = np.fromiter(itertools.chain.from_iterable(encoded), dtype=np.int32, count=int(offsets[-1]))
+        return token_ids, offsets
+
+    def _embed_token_ids(self, token_ids: np.ndarray, offsets: np.ndarray) -> torch.Tensor:
+        """Embed pre-tokenized chunks in length-sorted, hand-padded batches."""
+        lengths = np.diff(offsets)
+        order = np.argsort(lengths, kind='stable')
+        pad_id = self.embedding_model.tokenizer.pad_token_id or 0
+        
+        embeddings_list = []
+        with torch.inference_mode():
+            for i in range(0, len(order), Config.BATCH_SIZE):
+                batch = order[i:i + Config.BATCH_SIZE]
+                batch_lengths = lengths[batch]
+                max_len = int(batch_lengths.max())
+                
+                # Pad each batch only to its own longest sequence
+                input_ids = np.full((len(batch), max_len), pad_id, dtype=np.int64)
+                for row, idx in enumerate(batch):
+                    input_ids[row, :batch_lengths[row]] = token_ids[offsets[idx]:offsets[idx + 1]]
+                attention_mask = (np.arange(max_len) < batch_lengths[:, None]).astype(np.int64)
+                
+                input_ids = torch.from_numpy(input_ids).to(self.model_device)
+                features = {
+                    'input_ids': input_ids,
+                    'attention_mask': torch.from_numpy(attention_mask).to(self.model_device),
+                    'token_type_ids': torch.zeros_like(input_ids)
+                }
+                embeddings_list.append(self.embedding_model(features)['sentence_embedding'])
+            
+            embeddings = F.normalize(torch.cat(embeddings_list, dim=0), p=2, dim=1)
+        
+        # Restore original chunk order
+        inverse = torch.from_numpy(np.argsort(order)).to(embeddings.device)
+        return embeddings[inverse]
 
     def create_chunks_and_embeddings(self) -> None:
         """Optimized chunk and embedding creation."""
-        self.text_chunks = []
+        self.chunk_texts = []
+        self.sources = []
+        self.extra_sources = {}
         if not self.pdf_contents:
             return False
 
-        # Create chunks
-        for filename, content in self.pdf_contents.items():
-            file_chunks = self.smart_chunk_text(content, filename)
-            self.text_chunks.extend(file_chunks)
+        # Create chunks as parallel columns, embedding verbatim duplicates only once
+        chunk_sources = []
+        chunk_ids = []
+        seen: Dict[bytes, int] = {}
+        for source_idx, (filename, content) in enumerate(self.pdf_contents.items()):
+            self.sources.append(filename)
+            for chunk_id, chunk_text in enumerate(self.smart_chunk_text(content)):
+                key = hashlib.blake2b(chunk_text.encode('utf-8'), digest_size=16).digest()
+                chunk_idx = seen.get(key)
+                if chunk_idx is not None:
+                    # Keep every source of repeated boilerplate so citations stay complete
+                    extra = self.extra_sources.setdefault(chunk_idx, [])
+                    if source_idx != chunk_sources[chunk_idx] and source_idx not in extra:
+                        extra.append(source_idx)
+                    continue
+                
+                seen[key] = len(self.chunk_texts)
+                self.chunk_texts.append(chunk_text)
+                chunk_sources.append(source_idx)
+                chunk_ids.append(chunk_id)
+        
+        self.extra_sources = {idx: extra for idx, extra in self.extra_sources.items() if extra}
+        
+        self.chunk_sources = np.array(chunk_sources, dtype=np.intp)
+        self.chunk_ids = np.array(chunk_ids, dtype=np.intp)
         
-        if not self.text_chunks:
+        if not self.chunk_texts:
             return False
 
-        # Generate embeddings with optimized batching
-        chunk_texts = [chunk['text'] for chunk in self.text_chunks]
+        # Tokenize everything once, then embed with length-sorted ("smart") batching
         try:
-            embeddings_list = []
+            self.chunk_token_ids = self._tokenize_chunks(self.chunk_texts)
             
-            for i in range(0, len(chunk_texts), Config.BATCH_SIZE):
-                batch = chunk_texts[i:i + Config.BATCH_SIZE]
-                
-                # Optimized retry logic
-                for attempt in range(Config.MAX_RETRIES):
-                    try:
-                        batch_embeddings = self.embedding_model.encode(
-                            batch, 
-                            convert_to_tensor=True,
-                            show_progress_bar=False,
-                            batch_size=len(batch),
-                            normalize_embeddings=True  # Normalize for better similarity
-                        )
-                        embeddings_list.append(batch_embeddings)
-                        break
-                    except Exception as e:
-                        if attempt == Config.MAX_RETRIES - 1:
-                            raise e
-                        else:
-                            time.sleep(2 ** attempt)
-            
-            # Combine all embeddings
-            self.chunk_embeddings = torch.cat(embeddings_list, dim=0)
-            
-            # Create TF-IDF index
+            # Optimized retry logic
+            for attempt in range(Config.MAX_RETRIES):
+                try:
+                    embeddings = self._embed_token_ids(*self.chunk_token_ids)
+                    break
+                except Exception as e:
+                    if attempt == Config.MAX_RETRIES - 1:
+                        raise e
+                    else:
+                        time.sleep(2 ** attempt)
+            
+            self.chunk_embeddings = self._to_search_dtype(embeddings)
+            
+            # Create TF-IDF and ANN indexes
             self._create_tfidf_index()
+            self._create_faiss_index()
             
             return True
             
@@ -379,80 +694,124 @@ class InstitutionalPDFChatbot:
             st.error(f"Error generating embeddings: {e}")
             return False
 
-    def hybrid_search(self, question: str) -> List[Dict]:
-        """Optimized hybrid search with fixed parameters."""
-        if self.chunk_embeddings is None or len(self.text_chunks) == 0:
-            return []
-            
-        try:
-            # Encode question with retry
-            question_embedding = None
-            for attempt in range(Config.MAX_RETRIES):
-                try:
-                    question_embedding = self.embedding_model.encode(
+    def chunk_source_names(self, chunk_idx: int) -> List[str]:
+        """All documents a (deduplicated) chunk appears in, primary source first."""
+        source_ids = [self.chunk_sources[chunk_idx]] + self.extra_sources.get(int(chunk_idx), [])
+        return [self.sources[source_idx] for source_idx in source_ids]
+
+    def encode_question(self, question: str) -> Optional[torch.Tensor]:
+        """Encode a question with retry; returns None if encoding keeps failing."""
+        for attempt in range(Config.MAX_RETRIES):
+            try:
+                with torch.inference_mode():
+                    return self.embedding_model.encode(
                         question, 
                         convert_to_tensor=True,
                         normalize_embeddings=True
                     )
-                    break
-                except Exception as e:
-                    if attempt == Config.MAX_RETRIES - 1:
-                        return []
-                    time.sleep(2 ** attempt)
+            except Exception as e:
+                if attempt == Config.MAX_RETRIES - 1:
+                    return None
+                time.sleep(2 ** attempt)
+        return None
+
+    def hybrid_search(self, question: str, question_embedding: Optional[torch.Tensor] = None) -> Tuple[List[Dict], float, float]:
+        """Optimized hybrid search; returns the relevant chunks, best raw cosine and best keyword score."""
+        if self.chunk_embeddings is None or len(self.chunk_texts) == 0:
+            return [], 0.0, 0.0
             
-            # Semantic similarity
-            semantic_scores = util.cos_sim(question_embedding, self.chunk_embeddings)[0]
+        try:
+            if question_embedding is None:
+                question_embedding = self.encode_question(question)
+            if question_embedding is None:
+                return [], 0.0, 0.0
             
             # Keyword search
-            keyword_scores = np.zeros(len(self.text_chunks))
+            num_chunks = len(self.chunk_texts)
+            keyword_scores = np.zeros(num_chunks)
             if self.tfidf_vectorizer is not None and self.tfidf_matrix is not None:
                 question_tfidf = self.tfidf_vectorizer.transform([question])
                 keyword_similarities = cosine_similarity(question_tfidf, self.tfidf_matrix)[0]
                 keyword_scores = keyword_similarities
             
+            k = min(Config.SEARCH_RESULTS, num_chunks)
+            question_embedding = question_embedding.to(self.chunk_embeddings.device, dtype=self.chunk_embeddings.dtype)
+            keyword_top = np.argpartition(keyword_scores, -k)[-k:]
+            
+            # Semantic similarity (embeddings are L2-normalized, so cosine == dot product)
+            if self.faiss_index is not None:
+                # Candidates: HNSW neighbours plus the keyword top-k, rescored exactly
+                query = np.ascontiguousarray(question_embedding.float().cpu().numpy().reshape(1, -1))
+                _, ann_ids = self.faiss_index.search(query, min(k * 3, num_chunks))
+                ann_ids = ann_ids[0][ann_ids[0] >= 0]
+                candidates = np.union1d(ann_ids, keyword_top)
+                
+                candidate_ids = torch.from_numpy(candidates).to(self.chunk_embeddings.device)
+                semantic_scores = torch.mv(self.chunk_embeddings[candidate_ids], question_embedding)
+            else:
+                # Score everything on device and only bring the top candidates to the host
+                all_scores = torch.mv(self.chunk_embeddings, question_embedding)
+                _, semantic_top = torch.topk(all_scores, min(k * 3, num_chunks))
+                candidates = np.union1d(semantic_top.cpu().numpy(), keyword_top)
+                
+                candidate_ids = torch.from_numpy(candidates).to(all_scores.device)
+                semantic_scores = all_scores[candidate_ids]
+            
+            semantic_scores = semantic_scores.float().cpu().numpy()
+            
+            # Raw scores used to decide whether the question is answerable at all;
+            # the candidates always include the best semantic match
+            best_semantic = float(semantic_scores.max())
+            best_keyword = float(keyword_scores.max())
+            keyword_scores = keyword_scores[candidates]
+            
             # Optimized score combination
             semantic_weight = 0.7
             keyword_weight = 0.3
             
-            semantic_scores_norm = (semantic_scores.cpu().numpy() + 1) / 2
-            keyword_scores_norm = keyword_scores
-            
-            combined_scores = (semantic_weight * semantic_scores_norm + 
-                             keyword_weight * keyword_scores_norm)
+            combined_scores = _combine_scores(semantic_scores, keyword_scores, semantic_weight, keyword_weight)
             
-            # Get top results with fixed count
-            top_indices = np.argsort(combined_scores)[-Config.SEARCH_RESULTS:][::-1]
+            # Get top results with fixed count (partial selection, then sort only the top-k)
+            k = min(k, len(combined_scores))
+            top_indices = np.argpartition(combined_scores, -k)[-k:]
+            top_indices = top_indices[np.argsort(-combined_scores[top_indices])]
             
-            relevant_chunks = []
-            for idx in top_indices:
-                chunk = self.text_chunks[idx].copy()
-                chunk['semantic_score'] = semantic_scores[idx].item()
-                chunk['keyword_score'] = keyword_scores[idx]
-                chunk['combined_score'] = combined_scores[idx]
-                relevant_chunks.append(chunk)
+            # Filter low scores, then build result dicts from the columns
+            top_indices = top_indices[combined_scores[top_indices] > 0.15]  # Slightly higher threshold
+            chunk_indices = candidates[top_indices]
             
-            # Filter low scores
-            relevant_chunks = [chunk for chunk in relevant_chunks 
-                             if chunk['combined_score'] > 0.15]  # Slightly higher threshold
+            relevant_chunks = [
+                {
+                    'text': self.chunk_texts[chunk_idx],
+                    'source': self.sources[self.chunk_sources[chunk_idx]],
+                    'sources': self.chunk_source_names(chunk_idx),
+                    'chunk_id': int(self.chunk_ids[chunk_idx]),
+                    'semantic_score': float(semantic_scores[idx]),
+                    'keyword_score': float(keyword_scores[idx]),
+                    'combined_score': float(combined_scores[idx])
+                }
+                for idx, chunk_idx in zip(top_indices, chunk_indices)
+            ]
             
-            return relevant_chunks
+            return relevant_chunks, best_semantic, best_keyword
             
         except Exception as e:
-            return []
+            return [], 0.0, 0.0
 
-    def generate_answer(self, question: str, context_chunks: List[Dict], client: OpenAI) -> str:
-        """Optimized answer generation."""
+    def generate_answer(self, question: str, context_chunks: List[Dict], client: OpenAI) -> Iterator[str]:
+        """Optimized answer generation, streamed as text deltas; raises if the API call fails."""
         if not context_chunks:
-            return "I couldn't find relevant information in the institutional documents to answer your question."
+            yield Config.NO_ANSWER_MESSAGE
+            return
         
         # Prepare context efficiently
         context_str = ""
         sources = set()
         
         for i, chunk in enumerate(context_chunks[:8]):  # Limit context for efficiency
-            context_str += f"=== Source {i+1} ({chunk['source']}) ===\n"
+            context_str += f"=== Source {i+1} ({', '.join(chunk['sources'])}) ===\n"
             context_str += f"{chunk['text']}\n\n"
-            sources.add(chunk['source'])
+            sources.update(chunk['sources'])
         
         # Optimized prompt
         prompt = f"""Answer the question based on the provided institutional documents.
@@ -466,25 +825,141 @@ Provide a comprehensive answer using only the information above. Cite sources in
 
 Answer:"""
 
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an institutional knowledge assistant. Answer questions accurately based on provided documents and always cite sources."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,  # Reduced for efficiency
-                temperature=0.1,
-                top_p=0.95,
-                frequency_penalty=0.1
+        # Errors propagate to the caller so a failed stream is never mistaken for an answer
+        stream = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are an institutional knowledge assistant. Answer questions accurately based on provided documents and always cite sources."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1500,  # Reduced for efficiency
+            temperature=0.1,
+            top_p=0.95,
+            frequency_penalty=0.1,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content or ''
+                if delta:
+                    yield delta
+
+
+class AnswerCache:
+    """Two-tier answer cache: exact question match in SQLite, then semantic match via FAISS."""
+    
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.index = None
+        self.index_keys: List[str] = []
+        
+        db_path = os.path.join(Config.CACHE_DIR, Config.ANSWER_CACHE_FILE)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                question TEXT,
+                answer TEXT,
+                sources TEXT,
+                embedding BLOB,
+                created_at TEXT,
+                PRIMARY KEY (namespace, key)
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Error generating response: {e}"
+        """)
+        self.conn.commit()
+        
+        # Rebuild the semantic index from stored embeddings; entries are
+        # namespaced by knowledge-base identifier so document changes invalidate them
+        if FAISS_AVAILABLE:
+            rows = self.conn.execute(
+                "SELECT key, embedding FROM answers WHERE namespace = ? AND embedding IS NOT NULL",
+                (namespace,)
+            ).fetchall()
+            for key, blob in rows:
+                self._add_to_index(key, np.frombuffer(blob, dtype=np.float32))
+    
+    @staticmethod
+    def make_key(question: str) -> str:
+        """Key for exact matching on the normalized question."""
+        return hashlib.sha1(question.strip().lower().encode('utf-8')).hexdigest()
+    
+    def _add_to_index(self, key: str, embedding: np.ndarray) -> None:
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(embedding.shape[0])
+        self.index.add(embedding.reshape(1, -1))
+        self.index_keys.append(key)
+    
+    def _get_by_key(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT answer, sources FROM answers WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+    
+    def get_exact(self, question: str) -> Optional[Tuple[str, List[str]]]:
+        """Return (answer, sources) for an identical normalized question."""
+        return self._get_by_key(self.make_key(question))
+    
+    def get_similar(self, question: str, question_embedding: torch.Tensor) -> Optional[Tuple[str, List[str]]]:
+        """Return (answer, sources) for a cached question above the similarity threshold
+        that also asks about exactly the same content terms."""
+        if self.index is None or question_embedding is None:
+            return None
+        
+        query = np.ascontiguousarray(question_embedding.float().cpu().numpy().reshape(1, -1), dtype=np.float32)
+        with self.lock:
+            scores, ids = self.index.search(query, min(Config.ANSWER_CACHE_CANDIDATES, self.index.ntotal))
+            keys = [self.index_keys[i] for score, i in zip(scores[0], ids[0])
+                    if i >= 0 and score >= Config.ANSWER_CACHE_SIMILARITY]
+        
+        terms = content_terms(question)
+        for key in keys:
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT question, answer, sources FROM answers WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+            if row is not None and content_terms(row[0]) == terms:
+                return row[1], json.loads(row[2])
+        return None
+    
+    def store(self, question: str, answer: str, sources: List[str],
+              question_embedding: Optional[torch.Tensor] = None) -> None:
+        """Insert an answer into both cache tiers."""
+        key = self.make_key(question)
+        embedding = None
+        if question_embedding is not None:
+            embedding = np.ascontiguousarray(question_embedding.float().cpu().numpy(), dtype=np.float32)
+        
+        with self.lock:
+            existing = self.conn.execute(
+                "SELECT 1 FROM answers WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, question, answer, json.dumps(sources),
+                 embedding.tobytes() if embedding is not None else None,
+                 datetime.now().isoformat())
+            )
+            self.conn.commit()
+            if FAISS_AVAILABLE and embedding is not None and existing is None:
+                self._add_to_index(key, embedding)
 
 
 # --- STREAMLIT UI ---
 
+@st.cache_resource
+def get_answer_cache(namespace: str) -> AnswerCache:
+    """Shared answer cache for a knowledge base, reused across sessions."""
+    return AnswerCache(namespace)
+
 def get_openai_client():
     """Get OpenAI client with API key."""
     api_key = st.secrets.get("OPENAI_API_KEY") 
@@ -561,6 +1036,8 @@ def initialize_chatbot():
                 stat = os.stat(pdf_path)
                 file_stats.append(f"{os.path.basename(pdf_path)}-{stat.st_size}-{stat.st_mtime}")
             
+            # Include the embedding backend so INT8 ONNX and PyTorch caches never mix
+            file_stats.append(chatbot.embedding_backend)
             identifier = "institutional_" + hashlib.sha256("|".join(file_stats).encode('utf-8')).hexdigest()
             
             # Try to load from cache first
@@ -580,6 +1057,7 @@ def initialize_chatbot():
                     return None
             
             st.session_state.chatbot = chatbot
+            st.session_state.answer_cache = get_answer_cache(identifier)
             st.session_state.chatbot_initialized = True
             st.session_state.messages = []
             
@@ -618,7 +1096,7 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Documents", len(chatbot.pdf_contents))
-            st.metric("Knowledge Chunks", len(chatbot.text_chunks))
+            st.metric("Knowledge Chunks", len(chatbot.chunk_texts))
         with col2:
             st.metric("Chat Messages", len(st.session_state.messages))
             st.metric("Search Results", Config.SEARCH_RESULTS)
@@ -626,7 +1104,7 @@ def main():
         st.markdown("---")
         st.markdown("**Configuration:**")
         st.text(f"Chunk Size: {Config.CHUNK_SIZE}")
-        st.text(f"Overlap: {Config.CHUNK_OVERLAP}")
+        st.text(f"Overlap: {Config.CHUNK_OVERLAP_SENTENCES} sentences")
         st.text(f"Model: {Config.MODEL_NAME}")
         
         if st.session_state.messages:
@@ -678,9 +1156,45 @@ def main():
         # Generate response
         with st.chat_message("assistant"):
             with st.spinner("Searching knowledge base..."):
-                relevant_chunks = chatbot.hybrid_search(question)
-                answer = chatbot.generate_answer(question, relevant_chunks, openai_client)
+                answer_cache = st.session_state.answer_cache
+                
+                # Exact match skips embedding entirely; semantic match skips search and the LLM
+                question_embedding = None
+                cached = answer_cache.get_exact(question)
+                if cached is None:
+                    question_embedding = chatbot.encode_question(question)
+                    cached = answer_cache.get_similar(question, question_embedding)
+                
+                if cached is None:
+                    relevant_chunks, best_semantic, best_keyword = chatbot.hybrid_search(question, question_embedding)
+            
+            if cached is not None:
+                answer, _ = cached
+                st.markdown(answer)
+            elif not relevant_chunks or (best_semantic < Config.MIN_SEMANTIC_SCORE
+                                         and best_keyword < Config.MIN_KEYWORD_SCORE):
+                # Nothing relevant enough to justify an LLM call
+                answer = Config.NO_ANSWER_MESSAGE
                 st.markdown(answer)
+            else:
+                # Stream tokens into the message bubble as they arrive
+                placeholder = st.empty()
+                acc = []
+                failed = False
+                try:
+                    for delta in chatbot.generate_answer(question, relevant_chunks, openai_client):
+                        acc.append(delta)
+                        placeholder.markdown(''.join(acc) + "▌")
+                    answer = ''.join(acc).strip()
+                except Exception as e:
+                    # Drop any partial text rather than presenting it as an answer
+                    failed = True
+                    answer = f"Error generating response: {e}"
+                placeholder.markdown(answer)
+                
+                if not failed:
+                    sources = sorted({source for chunk in relevant_chunks for source in chunk['sources']})
+                    answer_cache.store(question, answer, sources, question_embedding)
         
         # Add assistant response
         st.session_state.messages.append({"role": "assistant", "content": answer})
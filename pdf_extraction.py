@@ -0,0 +1,39 @@
+"""PDF text extraction for worker processes.
+
+Kept separate from the Streamlit app so spawned/forkserver workers only import
+fitz, re and gc instead of re-running the whole app script.
+"""
+import gc
+import re
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+# Precompiled text-cleaning patterns
+_WS_RE = re.compile(r'\s+')
+_HYPH_RE = re.compile(r'(\w+)-\s+(\w+)')
+_PAGENUM_RE = re.compile(r'^\d+\s*$', re.MULTILINE)
+_NL_RE = re.compile(r'\n{3,}')
+
+def extract_pdf_text(pdf_path: str) -> Optional[str]:
+    """Extract and clean text from a single PDF (runs in a worker process)."""
+    doc = fitz.open(pdf_path)
+    try:
+        parts = []
+        
+        for page_num in range(len(doc)):
+            page_text = doc.load_page(page_num).get_text()
+            
+            # Collapse whitespace, then re-join hyphenated line breaks
+            page_text = _HYPH_RE.sub(r'\1\2', _WS_RE.sub(' ', page_text))
+            parts.append(page_text.strip())
+    finally:
+        doc.close()
+        gc.collect()
+    
+    # Final cleaning on the joined document
+    text = "\n\n".join(parts).strip()
+    text = _PAGENUM_RE.sub('', text)
+    text = _NL_RE.sub('\n\n', text)
+    
+    return text if len(text) > 100 else None